@@ -3,12 +3,27 @@ Created on Oct 31, 2015
 
 @author: Christopher Gutierrez
 """
-import gambit
+import os
+import re
 import pandas as pd
 import texttable as tt
 import yaml
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from multiprocessing import Pool
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# gambit is only needed to build the gambit games
+try:
+    import gambit
+except ImportError:
+    gambit = None
 
 
 class HNF(object):
@@ -27,6 +42,14 @@ class HNF(object):
         CUR_BELIEF = "Current Belief"
         ROW_ACT_NAME = "rowActionName"
         EU = "EU"
+        # player labels used in the gambit games
+        ROW_PLAYER = "Row Player"
+        COL_PLAYER = "Column Player"
+        # keys of the output arrays
+        SUMMARY_BELIEF = "Summary Belief"
+        HEU = "HEU"
+        MO = "MO"
+        PAYOFF = "Payoff"
 
     class HNFFactory(object):
         """
@@ -90,10 +113,6 @@ class HNF(object):
                 self.HNFOut.setCostsByAction(costRow[HNF.Consts.ROW_ACTION],
                                              costRow[HNF.Consts.COST_COL_ACTIONS])
 
-            # Gambit games -- each belief context will be modeled as a sep gambit game
-            for situation in self.HNFOut.situationNames:
-                self.HNFOut.append_gambit_game(situation)
-
 
         def __setBeliefs(self):
             """
@@ -118,6 +137,58 @@ class HNF(object):
             # set current beliefs
             self.HNFOut.set_current_belief(currentBeliefs)
 
+    class HeadlessRenderer(object):
+        """
+        DESC
+            Writes the HEU over uncertainty plots for many HNFInstances to files
+            without a display, using a process pool.
+        """
+
+        def __init__(self, directory, fileFormat="png", step=0.1, processes=None):
+            """
+            DESC
+                Set up the renderer.
+            INPUT
+                directory (str) - an existing directory to write the plots to
+                fileFormat (str) - the image format, png or svg
+                step (float) - the uncertainty step, see _uncertainty_sweep
+                processes (int) - number of worker processes, defaults to the
+                    number of cpus. 1 renders in this process.
+            """
+            assert fileFormat in ("png", "svg")
+            self.directory = directory
+            self.fileFormat = fileFormat
+            self.uncertainties = _uncertainty_sweep(step)
+            self.processes = processes
+
+        def render(self, hnfInstances, chunkSize=16):
+            """
+            DESC
+                Write one plot per HNFInstance. The curves are computed here and
+                only the drawing is done in the workers.
+            INPUT
+                hnfInstances (list) - the HNFInstances to plot
+                chunkSize (int) - number of plots handed to a worker at a time
+            OUTPUT
+                a list of the file names written, in the order of hnfInstances
+            """
+            jobs = list()
+            for i, hnf in enumerate(hnfInstances):
+                fileName = os.path.join(self.directory, "%s_%d.%s" % (_safe_file_name(hnf.HNFName),
+                                                                     i, self.fileFormat))
+                jobs.append((fileName, hnf.HNFName, hnf.rowActionNames, self.uncertainties,
+                             hnf.calc_heu_over_uncertainty(self.uncertainties)))
+
+            if self.processes == 1:
+                return list(map(_render_heu_chart, jobs))
+
+            pool = Pool(self.processes)
+            try:
+                return pool.map(_render_heu_chart, jobs, chunkSize)
+            finally:
+                pool.close()
+                pool.join()
+
     class HNFInstance(object):
         """
         Hypergame Normal Form Class
@@ -182,8 +253,11 @@ class HNF(object):
             # init MO utility
             self.modelingOpponentUtility = dict.fromkeys(rowActionNames, 0.0)
 
-            # set gambit object
-            self.gambitGames = list()
+            # gambit games, the costs they were built from and the situations
+            # they are built for, see gambitGames
+            self.__gambitGames = None
+            self.__gambitCosts = None
+            self.__gambitSituations = list(situationNames)
 
             # init constants
             self.HNFName = name
@@ -191,6 +265,9 @@ class HNF(object):
             self.bestCaseEU = None
             self.worstCaseEU = None
 
+            # arrays shared with the variants, see get_output_arrays
+            self.__outputArrays = None
+
         def set_current_belief(self, updatedCurrentBeilefDict):
             """
             DESC:
@@ -275,12 +352,9 @@ class HNF(object):
             self.__verifySituationalBeliefs()
             self.__verifyCurrentBeliefs()
 
-            for columnActionName in self.columnActionNames:
-                tmpSum = 0.0
-                for situationName in self.situationNames:
-                    tmpSum += self.currentBelief[situationName] * \
-                              self.situationalBeliefs[columnActionName][situationName]
-                self.summaryBeliefs[columnActionName] = round(tmpSum, self.ROUND_DEC)
+            summary = HNF.HNFInstance.calc_summary_belief(*self.__get_belief_arrays())
+            for columnActionName, value in zip(self.columnActionNames, summary.tolist()):
+                self.summaryBeliefs[columnActionName] = value
 
             # make the summary belief is valid
             self.__verifySummaryBelief()
@@ -294,12 +368,10 @@ class HNF(object):
             self.__verifySummaryBelief()
             self.__verifyCurrentBeliefs()
             self.__verifySituationalBeliefs()
-            for rowActionName in self.rowActionNames:
-                tmpSum = 0.0
-                for columnActionName in self.columnActionNames:
-                    tmpSum += self.summaryBeliefs[columnActionName] * \
-                              self.costs[columnActionName][rowActionName]
-                self.expectedUtility[rowActionName] = round(tmpSum, self.ROUND_DEC)
+            eu = HNF.HNFInstance.calc_expected_utility(self.get_cost_array(),
+                                                       self.__get_summary_array())
+            for rowActionName, value in zip(self.rowActionNames, eu.tolist()):
+                self.expectedUtility[rowActionName] = value
 
             # now that we have EUs, update the best and worst EU vars
             self.__setBestWorstEU()
@@ -308,11 +380,10 @@ class HNF(object):
             """
             DESC: Calculates the hypergame expected utility.
             """
-            for rowActionName in self.rowActionNames:
-                self.hypergameExpectedUtility[rowActionName] = (1.0 - self.uncertainty) \
-                                                               * self.expectedUtility[rowActionName] + self.uncertainty \
-                                                                                                       * self.__getWorstCaseAction(
-                    rowActionName)
+            eu = np.array([self.expectedUtility[r] for r in self.rowActionNames], dtype=float)
+            heu = HNF.HNFInstance.calc_heu(eu, self.get_cost_array().min(axis=1), self.uncertainty)
+            for rowActionName, value in zip(self.rowActionNames, heu.tolist()):
+                self.hypergameExpectedUtility[rowActionName] = value
 
         def calcModelingOpponentUtility(self):
             """
@@ -321,10 +392,10 @@ class HNF(object):
                 MO = MAX_k(S_j * u_{j,k} ) for j = 1 to n
                 for column j and row k
             """
-            for rowActionName in self.rowActionNames:
-                self.modelingOpponentUtility[rowActionName] = \
-                    max(map(lambda i: self.summaryBeliefs[i] * \
-                                      self.costs.loc[rowActionName][i], self.columnActionNames))
+            mo = HNF.HNFInstance.calc_modeling_opponent(self.get_cost_array(),
+                                                        self.__get_summary_array())
+            for rowActionName, value in zip(self.rowActionNames, mo.tolist()):
+                self.modelingOpponentUtility[rowActionName] = value
             print self.modelingOpponentUtility
 
         # The following is need:
@@ -372,14 +443,20 @@ class HNF(object):
             #    (self.worstCaseEU[HNF.Consts.ROW_ACT_NAME], \
             #        self.worstCaseEU[HNF.Consts.EU])
 
-        def displayHNF(self):
+        def displayHNF(self, plotFileName=None):
             """
             DESC
                 Display the HNF table and uncertainty plot
+            INPUT
+                plotFileName (str) - if given, the plot is written to this file
+                    instead of being shown, so no display is needed
             OUTPUT
                 Text to the console showing the table and a matplot
             """
-            self.heuPlotOverUncertainty()
+            if plotFileName is None:
+                self.heuPlotOverUncertainty()
+            else:
+                self.save_heu_plot(plotFileName)
             self.printHNFTable()
 
         def heuPlotOverUncertainty(self, step=0.1):
@@ -387,28 +464,45 @@ class HNF(object):
             DESC: Plot the uncertainty from 0.0 to 1.0 given a step
             :param step:
             """
-            # save the current uncertainty and restore it after we plot it
-            oldUncertainty = self.uncertainty
-            # init hypergame expected utility
-            heuOverTime = dict.fromkeys(self.rowActionNames, [])
-            moOverTime = dict.fromkeys(self.rowActionNames, [])
-            for uncertainty in np.arange(0.0, 1.1, step):
-                self.setUncertainty(uncertainty)
-                self.calcHypergameExpectedUtility()
-                # save the HEU for each action
-                for rowActionName in self.rowActionNames:
-                    heuOverTime[rowActionName] = heuOverTime[rowActionName] + \
-                                                 [self.hypergameExpectedUtility[rowActionName]]
+            uncertainties = _uncertainty_sweep(step)
+            heuOverTime = self.calc_heu_over_uncertainty(uncertainties)
 
-            for rowActionName in self.rowActionNames:
-                plt.plot(np.arange(0.0, 1.1, step), heuOverTime[rowActionName], label=rowActionName)
+            for i, rowActionName in enumerate(self.rowActionNames):
+                plt.plot(uncertainties, heuOverTime[:, i], label=rowActionName)
 
             plt.title("Hypergame Expected Utility over uncertainty")
             plt.xlabel("Uncertainty")
             plt.ylabel("Hypergame Expected Utility")
             plt.legend()
             plt.show()
-            self.uncertainty = oldUncertainty
+
+        def save_heu_plot(self, fileName, step=0.1):
+            """
+            DESC
+                Headless version of heuPlotOverUncertainty. Renders the plot off
+                screen and writes it to a file, the format (png, svg, ...) comes
+                from the file extension.
+            INPUT
+                fileName (str) - where to write the plot
+                step (float) - the uncertainty step
+            """
+            uncertainties = _uncertainty_sweep(step)
+            _render_heu_chart((fileName, self.HNFName, self.rowActionNames, uncertainties,
+                               self.calc_heu_over_uncertainty(uncertainties)))
+
+        def calc_heu_over_uncertainty(self, uncertainties):
+            """
+            DESC
+                Calculate the hypergame expected utility for every row action at
+                each of the given uncertainty values. self.uncertainty is left as is.
+            INPUT
+                uncertainties (list) - the uncertainty values
+            OUTPUT
+                A (uncertainties x row actions) numpy array
+            """
+            uncertainties = np.asarray(uncertainties, dtype=float)[:, np.newaxis]
+            eu = np.array([self.expectedUtility[r] for r in self.rowActionNames], dtype=float)
+            return HNF.HNFInstance.calc_heu(eu, self.get_cost_array().min(axis=1), uncertainties)
 
         def __verifyAllEntries(self):
             """
@@ -459,40 +553,378 @@ class HNF(object):
             self.bestCaseEU = {"rowActionName": bestCaseEUKey, \
                                HNF.Consts.EU: self.expectedUtility[bestCaseEUKey]}
 
-        def __getWorstCaseAction(self, rowActionName):
+        def get_cost_array(self):
             """
             DESC
-                get the worst case outcome for a given row action.
+                Get the cost matrix as a float numpy array.
+            OUTPUT
+                A (rows x columns) array ordered by self.rowActionNames and
+                self.columnActionNames
+            """
+            return self.costs.loc[self.rowActionNames, self.columnActionNames]\
+                .values.astype(float)
+
+        def __get_belief_arrays(self):
+            """
+            DESC: Get the situational beliefs (situations x columns) and current
+                belief (situations) as float numpy arrays
+            """
+            sb = self.situationalBeliefs.loc[self.situationNames, self.columnActionNames]\
+                .values.astype(float)
+            cb = np.array([self.currentBelief[s] for s in self.situationNames], dtype=float)
+            return sb, cb
+
+        def __get_summary_array(self):
+            """
+            DESC: Get self.summaryBeliefs as a float numpy array
+            """
+            return np.array([self.summaryBeliefs[c] for c in self.columnActionNames], dtype=float)
+
+        def get_output_arrays(self):
+            """
+            DESC
+                Get the inputs and outputs of the HNF as read only numpy arrays.
+                They are shared with every variant of this HNF. The cached arrays
+                are checked against the current costs, beliefs and uncertainty on
+                every call and rebuilt if any of them changed, however it was
+                changed.
+            OUTPUT
+                A dictionary with the input arrays "costs" (rows x columns),
+                "situationalBeliefs" (situations x columns), "currentBelief"
+                (situations) and "uncertainty", plus the output arrays keyed by
+                HNF.Consts.SUMMARY_BELIEF, EU, HEU, MO and "worstCase"
+            """
+            inputs = dict(zip(("costs", "situationalBeliefs", "currentBelief"),
+                              (self.get_cost_array(), ) + self.__get_belief_arrays()))
+            uncertainty = float(self.uncertainty)
+            cached = self.__outputArrays
+            if cached is None or cached["uncertainty"] != uncertainty or \
+                    not all(np.array_equal(cached[key], inputs[key]) for key in inputs):
+                self.__outputArrays = _read_only(HNF.HNFInstance.calc_output_arrays(
+                    inputs["costs"], inputs["situationalBeliefs"], inputs["currentBelief"], uncertainty))
+            return self.__outputArrays
+
+        @staticmethod
+        def calc_output_arrays(costs, situationalBeliefs, currentBelief, uncertainty):
+            """
+            DESC
+                Array version of initSummaryBelief, initExpectedUtility,
+                calcHypergameExpectedUtility and calcModelingOpponentUtility. Every
+                input may have extra leading dimensions to evaluate a stack of
+                HNFs at once.
             INPUT
-                A row action name
+                costs (array) - (..., rows, columns)
+                situationalBeliefs (array) - (..., situations, columns)
+                currentBelief (array) - (..., situations)
+                uncertainty (float or array) - (...)
             OUTPUT
-                A dictionary with the name of the column action and the utility
+                A dictionary of the inputs and outputs, see get_output_arrays
             """
-            # check to see if the row action name is valid
-            assert rowActionName in self.rowActionNames
-            return min(self.costs.loc[rowActionName])
+            summary = HNF.HNFInstance.calc_summary_belief(situationalBeliefs, currentBelief)
+            out = HNF.HNFInstance.calc_row_outputs(costs, summary, uncertainty)
+            out.update({"costs": costs,
+                        "situationalBeliefs": situationalBeliefs,
+                        "currentBelief": currentBelief,
+                        "uncertainty": np.asarray(uncertainty, dtype=float),
+                        HNF.Consts.SUMMARY_BELIEF: summary})
+            return out
 
-        def create_gambit_game(self, situation):
-            g = gambit.Game.new_table([len(self.rowActionNames), len(self.columnActionNames)])
-            g.title = situation
-            g.players[0].label = "Row Player"
-            self.__set_gambit_actions(g, 0, self.rowActionNames)
-            g.players[1].label = "Column Player"
-            self.__set_gambit_actions(g, 1, self.columnActionNames)
+        @staticmethod
+        def calc_row_outputs(costs, summary, uncertainty):
+            """
+            DESC
+                Calculate the row outputs. Each row's outputs only depend on its
+                own costs, so costs can hold any subset of the rows.
+            INPUT
+                costs (array) - (..., rows, columns)
+                summary (array) - (..., columns)
+                uncertainty (float or array) - (...)
+            OUTPUT
+                A dictionary of (..., rows) arrays keyed by HNF.Consts.EU, HEU, MO
+                and "worstCase"
+            """
+            uncertainty = np.asarray(uncertainty, dtype=float)[..., np.newaxis]
+            eu = HNF.HNFInstance.calc_expected_utility(costs, summary)
+            worstCase = costs.min(axis=-1)
+            return {"worstCase": worstCase,
+                    HNF.Consts.EU: eu,
+                    HNF.Consts.HEU: HNF.HNFInstance.calc_heu(eu, worstCase, uncertainty),
+                    HNF.Consts.MO: HNF.HNFInstance.calc_modeling_opponent(costs, summary)}
+
+        @staticmethod
+        def calc_summary_belief(situationalBeliefs, currentBelief):
+            """
+            DESC: summary belief = current belief * situational beliefs, rounded
+                to ROUND_DEC. (..., situations x columns), (..., situations) ->
+                (..., columns)
+            """
+            return _round(np.einsum('...s,...sc->...c', currentBelief, situationalBeliefs),
+                          HNF.HNFInstance.ROUND_DEC)
+
+        @staticmethod
+        def calc_expected_utility(costs, summary):
+            """
+            DESC: EU = costs * summary belief, rounded to ROUND_DEC.
+                (..., rows x columns), (..., columns) -> (..., rows)
+            """
+            return _round(np.einsum('...rc,...c->...r', costs, summary), HNF.HNFInstance.ROUND_DEC)
+
+        @staticmethod
+        def calc_heu(eu, worstCase, uncertainty):
+            """
+            DESC: HEU = (1 - uncertainty) * EU + uncertainty * worst case. The
+                arguments only need to broadcast.
+            """
+            return (1.0 - uncertainty) * eu + uncertainty * worstCase
+
+        @staticmethod
+        def calc_modeling_opponent(costs, summary):
+            """
+            DESC: MO = MAX_j(S_j * u_{j,k}) for column j and row k.
+                (..., rows x columns), (..., columns) -> (..., rows)
+            """
+            return (costs * summary[..., np.newaxis, :]).max(axis=-1)
 
-            for col_ind, col_name in enumerate(self.columnActionNames):
-                for row_ind, row_name in enumerate(self.rowActionNames):
-                    g[row_ind, col_ind][0] = int(self.costs[col_name][row_name])
-                    # hack for now
-                    g[row_ind, col_ind][1] = int(-1 * self.costs[col_name][row_name])
+        def create_variant(self, costs=None, situationalBeliefs=None, currentBelief=None,
+                           uncertainty=None, name=""):
+            """
+            DESC
+                Create a what-if variant of this HNF. See HNF.HNFVariant.
+            """
+            return HNF.HNFVariant(self, costs, situationalBeliefs, currentBelief, uncertainty, name)
 
+        def evaluate_variants(self, variants, diff=True):
+            """
+            DESC
+                Evaluate a family of variants of this HNF in one batched pass.
+            INPUT
+                variants (list) - HNFVariants created from this HNF
+                diff (bool) - if True return the variant outputs minus the outputs
+                    of this HNF, else the variant outputs
+            OUTPUT
+                A dictionary keyed by HNF.Consts.SUMMARY_BELIEF, EU, HEU and MO. Each
+                value is a DataFrame with one row per variant (indexed by the
+                variant name or its position) and one column per column action
+                (summary belief) or row action (the rest).
+            """
+            assert all(v.base is self for v in variants)
+            base = self.get_output_arrays()
+            nVariants = len(variants)
+
+            # copy the base arrays once for the whole family, then scatter all
+            # the overrides in with one assignment per array
+            stacked = dict()
+            for key in ("costs", "situationalBeliefs", "currentBelief"):
+                stacked[key] = np.repeat(base[key][np.newaxis], nVariants, axis=0)
+                overrides = [(i, ) + k + (val, ) for i, v in enumerate(variants)
+                             for k, val in v.overrides[key].items()]
+                if overrides:
+                    columns = list(zip(*overrides))
+                    stacked[key][tuple(map(list, columns[:-1]))] = columns[-1]
+            uncertainty = np.array([base["uncertainty"] if v.uncertainty is None else v.uncertainty
+                                    for v in variants], dtype=float)
+
+            for v in variants:
+                v.verify(base)
+            out = {HNF.Consts.SUMMARY_BELIEF: np.repeat(base[HNF.Consts.SUMMARY_BELIEF][np.newaxis],
+                                                        nVariants, axis=0)}
+            beliefVariants = [i for i, v in enumerate(variants) if v.beliefs_overridden()]
+            if beliefVariants:
+                out[HNF.Consts.SUMMARY_BELIEF][beliefVariants] = HNF.HNFInstance.calc_summary_belief(
+                    stacked["situationalBeliefs"][beliefVariants], stacked["currentBelief"][beliefVariants])
+            out.update(HNF.HNFInstance.calc_row_outputs(stacked["costs"], out[HNF.Consts.SUMMARY_BELIEF],
+                                                        uncertainty))
+
+            index = [v.name if v.name else i for i, v in enumerate(variants)]
+            result = dict()
+            for key, columnNames in ((HNF.Consts.SUMMARY_BELIEF, self.columnActionNames),
+                                     (HNF.Consts.EU, self.rowActionNames),
+                                     (HNF.Consts.HEU, self.rowActionNames),
+                                     (HNF.Consts.MO, self.rowActionNames)):
+                values = out[key] - base[key] if diff else out[key]
+                result[key] = pd.DataFrame(values, index=index, columns=columnNames)
+            return result
+
+        def evaluate_mixed_strategies(self, rowStrategies=None, columnStrategies=None,
+                                      uncertainty=None, chunkSize=256):
+            """
+            DESC
+                Score every row strategy against every column strategy, both
+                mixed. For row strategy x and column strategy y:
+                    payoff = x * costs * y
+                    HEU = (1 - uncertainty) * payoff + uncertainty * min_j (x * costs)_j
+                    MO = max_j(y_j * (x * costs)_j)
+                which are EU, HEU and MO of the row action for a pure x with
+                y = summary belief. The stacks are processed chunkSize x chunkSize
+                at a time to bound the memory used.
+            INPUT
+                rowStrategies (array) - (n x rows), each row sums to 0.99 - 1. Defaults
+                    to every pure row action.
+                columnStrategies (array) - (m x columns), each row sums to 0.99 - 1, e.g.
+                    from mixed_strategies_from_profiles. Defaults to the summary
+                    belief.
+                uncertainty (float) - defaults to self.uncertainty
+                chunkSize (int) - number of strategies per chunk
+            OUTPUT
+                A dictionary keyed by HNF.Consts.PAYOFF, HEU and MO, each a
+                (n x m) numpy array
+            """
+            costs = self.get_cost_array()
+            if rowStrategies is None:
+                rowStrategies = np.eye(len(self.rowActionNames))
+            if columnStrategies is None:
+                columnStrategies = self.get_output_arrays()[HNF.Consts.SUMMARY_BELIEF]
+            if uncertainty is None:
+                uncertainty = self.uncertainty
+            rowStrategies = np.atleast_2d(np.asarray(rowStrategies, dtype=float))
+            columnStrategies = np.atleast_2d(np.asarray(columnStrategies, dtype=float))
+
+            assert rowStrategies.shape[1] == len(self.rowActionNames)
+            assert columnStrategies.shape[1] == len(self.columnActionNames)
+            assert (rowStrategies >= 0.0).all() and (columnStrategies >= 0.0).all()
+            # same tolerance as the current and summary beliefs
+            for strategies in (rowStrategies, columnStrategies):
+                sums = strategies.sum(axis=1)
+                assert ((sums >= 0.99) & ((sums <= 1.0) | np.isclose(sums, 1.0))).all()
+
+            shape = (len(rowStrategies), len(columnStrategies))
+            out = {HNF.Consts.PAYOFF: np.empty(shape),
+                   HNF.Consts.HEU: np.empty(shape),
+                   HNF.Consts.MO: np.empty(shape)}
+            for i in range(0, shape[0], chunkSize):
+                # expected cost of each column action for these row strategies
+                rowCosts = rowStrategies[i:i + chunkSize].dot(costs)
+                worstCase = rowCosts.min(axis=1)[:, np.newaxis]
+                for j in range(0, shape[1], chunkSize):
+                    cols = columnStrategies[j:j + chunkSize]
+                    payoff = rowCosts.dot(cols.T)
+                    out[HNF.Consts.PAYOFF][i:i + chunkSize, j:j + chunkSize] = payoff
+                    out[HNF.Consts.HEU][i:i + chunkSize, j:j + chunkSize] = \
+                        HNF.HNFInstance.calc_heu(payoff, worstCase, uncertainty)
+                    # the row strategies act as rows and the column strategies as
+                    # a stack of summary beliefs, giving (columns x rows)
+                    out[HNF.Consts.MO][i:i + chunkSize, j:j + chunkSize] = \
+                        HNF.HNFInstance.calc_modeling_opponent(rowCosts, cols).T
+            return out
+
+        def mixed_strategies_from_profiles(self, profiles):
+            """
+            DESC
+                Split mixed strategy profiles of the gambit games, e.g. the
+                equilibria found by a gambit solver, into row and column
+                strategy stacks for evaluate_mixed_strategies.
+            INPUT
+                profiles (list) - profiles that list the row player's strategy
+                    probabilities followed by the column player's
+            OUTPUT
+                (rowStrategies, columnStrategies), (n x rows) and (n x columns)
+                numpy arrays
+            """
+            nRows = len(self.rowActionNames)
+            nStrategies = nRows + len(self.columnActionNames)
+            profiles = [[float(p) for p in profile] for profile in profiles]
+            assert all(len(profile) == nStrategies for profile in profiles)
+            profiles = np.array(profiles, dtype=float).reshape(len(profiles), nStrategies)
+            return profiles[:, :nRows], profiles[:, nRows:]
+
+        def write_gambit_nfg(self, situation, out):
+            """
+            DESC
+                Write the gambit game for a given situation in Gambit's .nfg
+                (outcome) format. The payoffs are written straight from the cost
+                array at full precision, the column player gets the negated cost.
+            INPUT
+                situation (str) - the situation name, used as the game title
+                out (str or file) - a file name or an open file/buffer to write to
+            """
+            assert situation in self.situationNames
+
+            if not hasattr(out, "write"):
+                with open(out, 'w') as f:
+                    self.write_gambit_nfg(situation, f)
+                return
+
+            out.write("NFG 1 R %s { %s %s }\n\n" % (self.__nfg_quote(situation),
+                                                   self.__nfg_quote(HNF.Consts.ROW_PLAYER),
+                                                   self.__nfg_quote(HNF.Consts.COL_PLAYER)))
+            out.write("{ { %s }\n" % " ".join(map(self.__nfg_quote, self.rowActionNames)))
+            out.write("{ %s }\n}\n\"\"\n\n{\n" % " ".join(map(self.__nfg_quote,
+                                                                self.columnActionNames)))
+
+            # gambit lists profiles with the row player's strategy changing
+            # fastest, so walk the costs column by column. One outcome per cell.
+            costs = self.get_cost_array().T.ravel()
+            assert np.isfinite(costs).all(), "all costs must be set and finite"
+            # adding 0.0 turns -0.0 into 0.0. repr gives the shortest decimal
+            # that reads back as the same float, gambit reads it as a rational
+            payoffs = np.column_stack((costs, -costs)) + 0.0
+            out.writelines('{ "" %r, %r }\n' % (p1, p2) for p1, p2 in payoffs.tolist())
+            out.write("}\n")
+            out.write(" ".join(map(str, range(1, len(costs) + 1))))
+            out.write("\n")
+
+        def write_gambit_nfgs(self, directory):
+            """
+            DESC
+                Write one .nfg file per situation into the given directory.
+            INPUT
+                directory (str) - an existing directory
+            OUTPUT
+                a list of the file names written, in situation order
+            """
+            fileNames = list()
+            for i, situation in enumerate(self.situationNames):
+                fileName = os.path.join(directory, "%s_%d.nfg" % (_safe_file_name(self.HNFName), i))
+                self.write_gambit_nfg(situation, fileName)
+                fileNames.append(fileName)
+            return fileNames
 
-            return g
+        def create_gambit_game(self, situation):
+            """
+            DESC
+                Create the gambit game for a given situation by parsing the .nfg
+                written by write_gambit_nfg.
+            INPUT
+                situation (str) - the situation name
+            OUTPUT
+                a gambit game
+            """
+            if gambit is None:
+                raise ImportError("gambit is needed to create gambit games")
+            buf = StringIO()
+            self.write_gambit_nfg(situation, buf)
+            return gambit.Game.parse_game(buf.getvalue())
+
+        @property
+        def gambitGames(self):
+            """
+            DESC
+                The gambit games, one per situation plus any appended with
+                append_gambit_game. Each belief context is modeled as a sep
+                gambit game. They are created on first access, and checked
+                against the current costs on every access and rebuilt if the
+                costs changed, however they were changed.
+            """
+            costs = self.get_cost_array()
+            if self.__gambitGames is None or not np.array_equal(self.__gambitCosts, costs):
+                self.__gambitGames = [self.create_gambit_game(situation)
+                                      for situation in self.__gambitSituations]
+                self.__gambitCosts = costs
+            return self.__gambitGames
+
+        @gambitGames.setter
+        def gambitGames(self, games):
+            """
+            DESC
+                Replace the gambit games. They are kept until the costs change,
+                then rebuilt from the situations.
+            """
+            self.__gambitGames = list(games)
+            self.__gambitCosts = self.get_cost_array()
 
         @staticmethod
-        def __set_gambit_actions(g, player_index, action_names):
-            for i, rowAction in enumerate(action_names):
-                g.players[player_index].strategies[i].label = rowAction
+        def __nfg_quote(label):
+            return '"%s"' % label.replace('\\', '\\\\').replace('"', '\\"')
 
         def append_gambit_game(self, situation):
             """
@@ -501,4 +933,229 @@ class HNF(object):
             :param situation:
             :return:
             """
-            self.gambitGames.append(self.create_gambit_game(situation))
+            self.__gambitSituations.append(situation)
+            if self.__gambitGames is not None and \
+                    np.array_equal(self.__gambitCosts, self.get_cost_array()):
+                self.__gambitGames.append(self.create_gambit_game(situation))
+            else:
+                # built with the rest on the next access
+                self.__gambitGames = None
+
+    class HNFVariant(object):
+        """
+        DESC
+            A what-if variant of an HNFInstance. It keeps a reference to the base
+            HNF's arrays and only stores the entries it overrides. Evaluating it
+            recomputes only the outputs that depend on those entries.
+        """
+
+        def __init__(self, base, costs=None, situationalBeliefs=None, currentBelief=None,
+                     uncertainty=None, name=""):
+            """
+            DESC
+                Create the variant. Anything not overridden comes from the base.
+            INPUT
+                base (HNFInstance) - the HNF the variant is based on
+                costs (dict) - {rowActionName: {columnActionName: cost}}
+                situationalBeliefs (dict) - {situationName: {columnActionName: belief}}
+                currentBelief (dict) - {situationName: belief}
+                uncertainty (float) - the uncertainty
+                name (str) - the name of the variant
+            """
+            self.base = base
+            self.name = name
+            self.uncertainty = uncertainty
+
+            # overrides keyed by array index
+            self.overrides = {"costs": dict(), "situationalBeliefs": dict(), "currentBelief": dict()}
+            for rowActionName, updatedDict in (costs or {}).items():
+                for columnActionName, cost in updatedDict.items():
+                    key = (base.rowActionNames.index(rowActionName),
+                           base.columnActionNames.index(columnActionName))
+                    self.overrides["costs"][key] = float(cost)
+            for situationName, updatedDict in (situationalBeliefs or {}).items():
+                for columnActionName, belief in updatedDict.items():
+                    key = (base.situationNames.index(situationName),
+                           base.columnActionNames.index(columnActionName))
+                    self.overrides["situationalBeliefs"][key] = float(belief)
+            for situationName, belief in (currentBelief or {}).items():
+                key = (base.situationNames.index(situationName), )
+                self.overrides["currentBelief"][key] = float(belief)
+
+            # the variant's arrays and the base arrays they were built from
+            self.__outputArrays = None
+            self.__baseArrays = None
+
+        def beliefs_overridden(self):
+            """
+            DESC: True if the variant overrides any situational or current belief
+            """
+            return bool(self.overrides["situationalBeliefs"] or self.overrides["currentBelief"])
+
+        def verify(self, base=None):
+            """
+            DESC
+                Make sure the overridden beliefs are still valid, same checks as
+                the HNFInstance.
+            INPUT
+                base (dict) - the base's get_output_arrays(), fetched if not given
+            """
+            if base is None:
+                base = self.base.get_output_arrays()
+            if self.overrides["situationalBeliefs"]:
+                sb = self.__apply("situationalBeliefs", base)
+                assert np.allclose(sb.sum(axis=1), 1.0)
+            if self.overrides["currentBelief"]:
+                assert 0.99 <= self.__apply("currentBelief", base).sum() <= 1.0
+
+        def evaluate(self):
+            """
+            DESC
+                Calculate the variant's outputs. Outputs that do not depend on an
+                overridden entry are the base's arrays. All the arrays are read
+                only.
+            OUTPUT
+                A dictionary of arrays, see HNFInstance.get_output_arrays
+            """
+            return self.__evaluate(self.base.get_output_arrays())
+
+        def __evaluate(self, base):
+            """
+            DESC: evaluate against the given base arrays
+            """
+            if self.__outputArrays is not None and self.__baseArrays is base:
+                return self.__outputArrays
+
+            self.verify(base)
+            out = dict(base)
+            for key in ("costs", "situationalBeliefs", "currentBelief"):
+                out[key] = self.__apply(key, base)
+            if self.uncertainty is not None:
+                out["uncertainty"] = np.array(self.uncertainty, dtype=float)
+
+            if self.beliefs_overridden():
+                out[HNF.Consts.SUMMARY_BELIEF] = HNF.HNFInstance.calc_summary_belief(
+                    out["situationalBeliefs"], out["currentBelief"])
+                # every row depends on the summary belief
+                rows = list(range(len(self.base.rowActionNames)))
+            else:
+                rows = sorted(set(r for r, c in self.overrides["costs"]))
+
+            if rows:
+                rowOutputs = HNF.HNFInstance.calc_row_outputs(out["costs"][rows],
+                                                              out[HNF.Consts.SUMMARY_BELIEF],
+                                                              out["uncertainty"])
+                for key, values in rowOutputs.items():
+                    out[key] = base[key].copy()
+                    out[key][rows] = values
+            if self.uncertainty is not None and len(rows) < len(self.base.rowActionNames):
+                # the HEU of every row depends on the uncertainty
+                out[HNF.Consts.HEU] = HNF.HNFInstance.calc_heu(out[HNF.Consts.EU], out["worstCase"],
+                                                               out["uncertainty"])
+
+            self.__outputArrays = _read_only(out)
+            self.__baseArrays = base
+            return out
+
+        def diff(self):
+            """
+            DESC
+                The variant's outputs minus the base's outputs.
+            OUTPUT
+                A dictionary keyed by HNF.Consts.SUMMARY_BELIEF, EU, HEU and MO
+            """
+            base = self.base.get_output_arrays()
+            out = self.__evaluate(base)
+            return dict((key, out[key] - base[key])
+                        for key in (HNF.Consts.SUMMARY_BELIEF, HNF.Consts.EU,
+                                    HNF.Consts.HEU, HNF.Consts.MO))
+
+        def __apply(self, key, base):
+            """
+            DESC: Copy the base array for key and write this variant's overrides into it
+            """
+            values = base[key]
+            if not self.overrides[key]:
+                return values
+            values = values.copy()
+            for index, value in self.overrides[key].items():
+                values[index] = value
+            return values
+
+
+# figure reused by every plot rendered in this process
+_heuFigure = None
+
+
+def _get_heu_figure():
+    """
+    DESC: Get this process' off screen figure, creating it on first use
+    """
+    global _heuFigure
+    if _heuFigure is None:
+        _heuFigure = Figure()
+        FigureCanvasAgg(_heuFigure)
+        _heuFigure.add_subplot(111)
+    return _heuFigure
+
+
+def _render_heu_chart(job):
+    """
+    DESC
+        Draw a HEU over uncertainty plot on the reused figure and save it.
+    INPUT
+        job (tuple) - (fileName, title, rowActionNames, uncertainties, heu) where
+            heu is a (uncertainties x row actions) array
+    OUTPUT
+        the file name written
+    """
+    fileName, title, rowActionNames, uncertainties, heu = job
+    fig = _get_heu_figure()
+    ax = fig.axes[0]
+    ax.cla()
+    for i, rowActionName in enumerate(rowActionNames):
+        ax.plot(uncertainties, heu[:, i], label=rowActionName)
+
+    ax.set_title("Hypergame Expected Utility over uncertainty")
+    ax.set_xlabel("Uncertainty")
+    ax.set_ylabel("Hypergame Expected Utility")
+    ax.legend()
+    fig.suptitle(title)
+    fig.savefig(fileName)
+    return fileName
+
+
+def _uncertainty_sweep(step):
+    """
+    DESC
+        The uncertainties from 0.0 to 1.0, both included, about step apart.
+        The step is adjusted so the sweep ends exactly at 1.0.
+    """
+    assert 0.0 < step <= 1.0
+    return np.linspace(0.0, 1.0, int(round(1.0 / step)) + 1)
+
+
+def _round(values, decimals):
+    """
+    DESC
+        Round every value with the builtin round, the rounding the HNF has
+        always used (halves away from zero), so the arrays match the scalar
+        outputs exactly.
+    """
+    return np.vectorize(lambda v: round(v, decimals), otypes=[float])(values)
+
+
+def _read_only(arrays):
+    """
+    DESC: Make every numpy array in the dictionary read only, returns the dictionary
+    """
+    for values in arrays.values():
+        values.flags.writeable = False
+    return arrays
+
+
+def _safe_file_name(name):
+    """
+    DESC: Replace anything that is not safe in a file name (path separators, etc.)
+    """
+    return re.sub(r'[^\w.-]', '_', name)
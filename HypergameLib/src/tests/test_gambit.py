@@ -145,6 +145,26 @@ class MyTestCase(unittest.TestCase):
             for col_ind, colName in enumerate(DesertStormHNF.columnActionNames):
                 for row_ind, rowName in enumerate(DesertStormHNF.rowActionNames):
                     self.assertEqual(float(game[row_ind, col_ind][0]), DesertStormHNF.costs[colName][rowName])
+    def test_lazy_gambit_games(self):
+        """
+        DESC
+            The gambit games follow the costs and appended situations are kept
+        """
+        DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        DesertStormHNF.append_gambit_game("3x3 Subgame")
+        games = DesertStormHNF.gambitGames
+        self.assertEqual([g.title for g in games], ["3x3 Subgame", "6x6 Subgame", "3x3 Subgame"])
+        self.assertTrue(DesertStormHNF.gambitGames is games)
+
+        # edits that skip setCostsByAction rebuild the games too
+        DesertStormHNF.costs.loc["Attack", "Defender"] = 0.5
+        games = DesertStormHNF.gambitGames
+        self.assertEqual(len(games), 3)
+        self.assertEqual(float(games[0][0, 0][0]), 0.5)
+
+        DesertStormHNF.gambitGames = games[:1]
+        self.assertEqual(len(DesertStormHNF.gambitGames), 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,238 @@
+'''
+Tests that do not need gambit installed
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import numpy as np
+
+import HypergameLib
+from HypergameLib import HNF
+
+
+class Test(unittest.TestCase):
+
+    def test_write_gambit_nfg(self):
+        '''
+        DESC
+            Check the .nfg written for a situation against the cost matrix
+        '''
+        DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        buf = StringIO()
+        DesertStormHNF.write_gambit_nfg("3x3 Subgame", buf)
+        lines = buf.getvalue().splitlines()
+
+        self.assertEqual(lines[0], 'NFG 1 R "3x3 Subgame" { "Row Player" "Column Player" }')
+        outcomes = [l for l in lines if l.startswith('{ "" ')]
+        self.assertEqual(len(outcomes), 36)
+        # the row player's action changes fastest
+        self.assertEqual(outcomes[3], '{ "" 3.0, -3.0 }')
+        self.assertEqual(outcomes[30], '{ "" 4.0, -4.0 }')
+        self.assertEqual(lines[-1], " ".join(map(str, range(1, 37))))
+
+        # payoffs are written as the shortest decimal for the float
+        DesertStormHNF.setCostsByAction("Attack", {"Defender": 0.1})
+        buf = StringIO()
+        DesertStormHNF.write_gambit_nfg("3x3 Subgame", buf)
+        self.assertTrue('{ "" 0.1, -0.1 }' in buf.getvalue().splitlines())
+
+        # unset costs can not be written
+        unsetHNF = HNF.HNFInstance(["s"], ["r"], ["c"])
+        self.assertRaises(AssertionError, unsetHNF.write_gambit_nfg, "s", StringIO())
+        unsetHNF.setCostsByAction("r", {"c": float("inf")})
+        self.assertRaises(AssertionError, unsetHNF.write_gambit_nfg, "s", StringIO())
+
+    def test_headless_heu_plots(self):
+        '''
+        DESC
+            Check the HEU sweep against calcHypergameExpectedUtility and write
+            the plots without a display
+        '''
+        DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        heuOverTime = DesertStormHNF.calc_heu_over_uncertainty([0.0, 0.5, 1.0])
+        for i, uncertainty in enumerate([0.0, 0.5, 1.0]):
+            DesertStormHNF.setUncertainty(uncertainty)
+            DesertStormHNF.calcHypergameExpectedUtility()
+            for j, rowActionName in enumerate(DesertStormHNF.rowActionNames):
+                self.assertAlmostEqual(heuOverTime[i, j],
+                                       DesertStormHNF.hypergameExpectedUtility[rowActionName])
+
+        # the sweep always covers [0, 1] exactly
+        for step in (0.05, 0.1, 0.3):
+            uncertainties = HNF.HeadlessRenderer(".", step=step).uncertainties
+            self.assertEqual(uncertainties[0], 0.0)
+            self.assertEqual(uncertainties[-1], 1.0)
+
+        outDir = tempfile.mkdtemp()
+        try:
+            DesertStormHNF.HNFName = "Desert/Storm"
+            fileNames = HNF.HeadlessRenderer(outDir, "svg", processes=2)\
+                .render([DesertStormHNF, DesertStormHNF])
+            self.assertEqual(len(fileNames), 2)
+            for fileName in fileNames:
+                # the name's slash must not leave outDir
+                self.assertEqual(os.path.dirname(fileName), outDir)
+                self.assertTrue(os.path.getsize(fileName) > 0)
+                # same title as heuPlotOverUncertainty, the name on top of it
+                with open(fileName) as f:
+                    svg = f.read()
+                self.assertTrue("Hypergame Expected Utility over uncertainty" in svg)
+                self.assertTrue("Desert/Storm" in svg)
+        finally:
+            shutil.rmtree(outDir)
+
+    def test_variants(self):
+        '''
+        DESC
+            Check variants against the same changes made on a fresh HNF
+        '''
+        DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        costVariant = DesertStormHNF.create_variant(costs={"Attack": {"Screen": 7.0}},
+                                                    uncertainty=0.5, name="cost")
+        beliefVariant = DesertStormHNF.create_variant(currentBelief={"3x3 Subgame": 0.5,
+                                                                     "6x6 Subgame": 0.5},
+                                                      name="belief")
+        noopVariant = DesertStormHNF.create_variant()
+
+        changedHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        changedHNF.setCostsByAction("Attack", {"Screen": 7.0})
+        changedHNF.setUncertainty(0.5)
+        changedHNF.initExpectedUtility()
+        changedHNF.calcHypergameExpectedUtility()
+        changedHNF.calcModelingOpponentUtility()
+
+        diffs = DesertStormHNF.evaluate_variants([costVariant, beliefVariant, noopVariant])
+        for i, rowActionName in enumerate(DesertStormHNF.rowActionNames):
+            self.assertAlmostEqual(costVariant.evaluate()[HNF.Consts.HEU][i],
+                                   changedHNF.hypergameExpectedUtility[rowActionName])
+            self.assertAlmostEqual(costVariant.evaluate()[HNF.Consts.MO][i],
+                                   changedHNF.modelingOpponentUtility[rowActionName])
+            self.assertAlmostEqual(diffs[HNF.Consts.HEU].loc["cost", rowActionName],
+                                   changedHNF.hypergameExpectedUtility[rowActionName] -
+                                   DesertStormHNF.hypergameExpectedUtility[rowActionName])
+            self.assertAlmostEqual(diffs[HNF.Consts.EU].loc[2, rowActionName], 0.0)
+
+        self.assertAlmostEqual(diffs[HNF.Consts.SUMMARY_BELIEF].loc["belief", "Defender"], -0.3)
+
+        # the shared arrays can not be written through a variant
+        self.assertRaises(ValueError, costVariant.evaluate()[HNF.Consts.EU].__setitem__, 0, 1.0)
+        self.assertRaises(ValueError, noopVariant.evaluate()[HNF.Consts.EU].__setitem__, 0, 1.0)
+
+    def test_variants_follow_base(self):
+        '''
+        DESC
+            Changing the base after the variants exist, even without the
+            setters, rebuilds the variant outputs and diffs
+        '''
+        DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        costVariant = DesertStormHNF.create_variant(costs={"Attack": {"Screen": 7.0}}, name="cost")
+        noopVariant = DesertStormHNF.create_variant(name="noop")
+        before = DesertStormHNF.evaluate_variants([costVariant, noopVariant])
+        self.assertNotAlmostEqual(before[HNF.Consts.EU].loc["cost", "Attack"], 0.0)
+
+        DesertStormHNF.costs.loc["Attack", "Screen"] = 7.0
+        DesertStormHNF.uncertainty = 0.5
+        after = DesertStormHNF.evaluate_variants([costVariant, noopVariant])
+        for key in (HNF.Consts.EU, HNF.Consts.HEU, HNF.Consts.MO):
+            self.assertTrue((after[key] == 0.0).all().all())
+            self.assertTrue((costVariant.diff()[key] == 0.0).all())
+
+        heu = DesertStormHNF.get_output_arrays()[HNF.Consts.HEU]
+        DesertStormHNF.initExpectedUtility()
+        DesertStormHNF.calcHypergameExpectedUtility()
+        for i, rowActionName in enumerate(DesertStormHNF.rowActionNames):
+            self.assertAlmostEqual(noopVariant.evaluate()[HNF.Consts.HEU][i], heu[i])
+            self.assertAlmostEqual(heu[i], DesertStormHNF.hypergameExpectedUtility[rowActionName])
+
+    def test_rounding(self):
+        '''
+        DESC
+            Outputs are rounded with the builtin round, ties included. 0.015625
+            is exact in binary, so it is a true tie at ROUND_DEC places.
+        '''
+        hnf = HNF.HNFInstance(["s"], ["r"], ["c1", "c2"])
+        hnf.setCostsByAction("r", {"c1": 0.015625, "c2": 0.0})
+        hnf.setSituationalBeliefs("s", {"c1": 1.0, "c2": 0.0})
+        hnf.set_current_belief({"s": 1.0})
+        hnf.initSummaryBelief()
+        hnf.initExpectedUtility()
+
+        self.assertEqual(hnf.expectedUtility["r"], round(0.015625, HNF.HNFInstance.ROUND_DEC))
+        self.assertEqual(hnf.get_output_arrays()[HNF.Consts.EU][0], hnf.expectedUtility["r"])
+        variant = hnf.create_variant(costs={"r": {"c2": 1.0}})
+        self.assertEqual(variant.evaluate()[HNF.Consts.EU][0], hnf.expectedUtility["r"])
+
+    def test_mixed_strategies(self):
+        '''
+        DESC
+            Pure row strategies against the summary belief give HEU and MO, and
+            chunking does not change the results
+        '''
+        DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        pure = DesertStormHNF.evaluate_mixed_strategies()
+        for i, rowActionName in enumerate(DesertStormHNF.rowActionNames):
+            self.assertAlmostEqual(pure[HNF.Consts.HEU][i, 0],
+                                   DesertStormHNF.hypergameExpectedUtility[rowActionName])
+            self.assertAlmostEqual(pure[HNF.Consts.MO][i, 0],
+                                   DesertStormHNF.modelingOpponentUtility[rowActionName])
+
+        rowStrategies, columnStrategies = DesertStormHNF.mixed_strategies_from_profiles(
+            [[0.5, 0.5, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1],
+             [0, 0, 0, 0.25, 0.75, 0, 0.2, 0.2, 0.2, 0.2, 0.2, 0]])
+        chunked = DesertStormHNF.evaluate_mixed_strategies(rowStrategies, columnStrategies, 0.5, chunkSize=1)
+        whole = DesertStormHNF.evaluate_mixed_strategies(rowStrategies, columnStrategies, 0.5)
+        self.assertEqual(whole[HNF.Consts.PAYOFF].shape, (2, 2))
+        self.assertAlmostEqual(whole[HNF.Consts.PAYOFF][0, 0], 2.5)
+        for key in (HNF.Consts.PAYOFF, HNF.Consts.HEU, HNF.Consts.MO):
+            self.assertTrue(np.allclose(chunked[key], whole[key]))
+
+        # no profiles give empty stacks, negative weights are not strategies
+        rowStrategies, columnStrategies = DesertStormHNF.mixed_strategies_from_profiles([])
+        self.assertEqual(rowStrategies.shape, (0, 6))
+        self.assertEqual(columnStrategies.shape, (0, 6))
+        self.assertRaises(AssertionError, DesertStormHNF.evaluate_mixed_strategies,
+                          [[1.5, -0.5, 0, 0, 0, 0]])
+
+    def test_mixed_strategies_partial_belief(self):
+        '''
+        DESC
+            A current belief summing to less than 1, which the HNF accepts, can
+            be scored against its summary belief
+        '''
+        DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+        DesertStormHNF.set_current_belief({"3x3 Subgame": 0.8, "6x6 Subgame": 0.195})
+        DesertStormHNF.initSummaryBelief()
+        DesertStormHNF.initExpectedUtility()
+        DesertStormHNF.calcHypergameExpectedUtility()
+        DesertStormHNF.calcModelingOpponentUtility()
+
+        pure = DesertStormHNF.evaluate_mixed_strategies()
+        for i, rowActionName in enumerate(DesertStormHNF.rowActionNames):
+            self.assertAlmostEqual(pure[HNF.Consts.HEU][i, 0],
+                                   DesertStormHNF.hypergameExpectedUtility[rowActionName], places=4)
+            self.assertAlmostEqual(pure[HNF.Consts.MO][i, 0],
+                                   DesertStormHNF.modelingOpponentUtility[rowActionName])
+        self.assertRaises(AssertionError, DesertStormHNF.evaluate_mixed_strategies,
+                          None, [[0.5, 0.4, 0, 0, 0, 0]])
+
+    def test_without_gambit(self):
+        '''
+        DESC
+            Load an HNF and score mixed strategies with gambit missing
+        '''
+        oldGambit = HypergameLib.gambit
+        HypergameLib.gambit = None
+        try:
+            DesertStormHNF = HNF.HNFFactory("../../config/DesertStormSettings").getHNFInstance()
+            pure = DesertStormHNF.evaluate_mixed_strategies()
+            self.assertEqual(pure[HNF.Consts.HEU].shape, (6, 1))
+            self.assertRaises(ImportError, lambda: DesertStormHNF.gambitGames)
+        finally:
+            HypergameLib.gambit = oldGambit
+
+
+if __name__ == "__main__":
+    unittest.main()